@@ -10,24 +10,97 @@
 # License for the specific language governing permissions and limitations
 # under the License.
 
+import concurrent.futures
 import contextlib
+import functools
 import json
 import logging
+import os
+import time
+import types
 
+import keystoneauth1.exceptions.catalog as ks_catalog
 import keystoneauth1.exceptions.http as ks_exceptions
 import osc_lib.exceptions as exceptions
 
 from osc_placement import version
 
-
-_http_error_to_exc = {
-    cls.http_status: cls
-    for cls in exceptions.ClientException.__subclasses__()
-}
+try:
+    # orjson is an optional, faster drop-in for decoding JSON bodies. It
+    # accepts bytes directly so the response content does not need to be
+    # decoded first.
+    import orjson as _json
+except ImportError:
+    _json = json
 
 
 LOG = logging.getLogger(__name__)
 
+# How long (in seconds) a negotiated microversion is trusted before the
+# server is probed again.
+VERSION_CACHE_TTL = 24 * 60 * 60
+
+# Upper bound of requests SessionClient.request_many runs in parallel.
+MAX_CONCURRENT_REQUESTS = 8
+
+
+def _parse_json(resp):
+    """Decode the JSON body of a response."""
+    return _json.loads(resp.content)
+
+
+@functools.lru_cache(None)
+def _http_error_to_exc():
+    """Map HTTP status codes to osc-lib exception classes.
+
+    Built on the first HTTP error rather than at import time, since most
+    commands never need it.
+    """
+    return types.MappingProxyType({
+        int(cls.http_status): cls
+        for cls in exceptions.ClientException.__subclasses__()
+        if cls.http_status is not None
+    })
+
+
+def _version_cache_path():
+    cache_dir = (os.environ.get('XDG_CACHE_HOME')
+                 or os.path.expanduser(os.path.join('~', '.cache')))
+    return os.path.join(cache_dir, 'osc-placement', 'microversion.json')
+
+
+def _load_version_cache():
+    try:
+        with open(_version_cache_path()) as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return cache if isinstance(cache, dict) else {}
+
+
+def _cache_entry_fresh(entry, now):
+    """Whether a microversion cache entry is well formed and not expired."""
+
+    if not isinstance(entry, dict) or not entry.get('version'):
+        return False
+    timestamp = entry.get('timestamp')
+    return (isinstance(timestamp, (int, float))
+            and 0 <= now - timestamp < VERSION_CACHE_TTL)
+
+
+def _save_version_cache(cache):
+    """Write the microversion cache, never failing the command."""
+
+    path = _version_cache_path()
+    tmp_path = '%s.%d' % (path, os.getpid())
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(tmp_path, 'w') as f:
+            json.dump(cache, f)
+        os.replace(tmp_path, path)
+    except OSError as exc:
+        LOG.debug('Unable to write microversion cache %s: %s', path, exc)
+
 
 @contextlib.contextmanager
 def _wrap_http_exceptions():
@@ -36,51 +109,164 @@ def _wrap_http_exceptions():
     try:
         yield
     except ks_exceptions.HttpError as exc:
-        if 400 <= exc.http_status < 500:
-            detail = json.loads(exc.response.content)['errors'][0]['detail']
+        http_status = int(exc.http_status)
+        if 400 <= http_status < 500:
+            detail = _parse_json(exc.response)['errors'][0]['detail']
             msg = detail.split('\n')[-1].strip()
-            exc_class = _http_error_to_exc.get(exc.http_status,
-                                               exceptions.CommandError)
-            raise exc_class(exc.http_status, msg) from exc
+            exc_class = _http_error_to_exc().get(http_status,
+                                                 exceptions.CommandError)
+            raise exc_class(http_status, msg) from exc
         else:
             raise
 
 
 class SessionClient(object):
     def __init__(self, session, ks_filter, api_version='1.0'):
+        # NOTE: The keystoneauth session is shared with the rest of the OSC
+        # client manager. It wraps a single requests.Session with
+        # keystoneauth's TCPKeepAliveAdapter mounted, so consecutive requests
+        # to placement already reuse pooled keep-alive connections. Do not
+        # mount a different adapter here, it would drop the TLS and TCP
+        # keepalive settings keystoneauth configures.
         self.session = session
         self.ks_filter = ks_filter
+        self._requested_api_version = api_version
+        self._version_from_cache = False
         self.negotiate_api_version(api_version)
 
     def request(self, method, url, **kwargs):
         version = kwargs.pop('version', None)
+        headers = kwargs.pop('headers', {})
+
+        with _wrap_http_exceptions():
+            try:
+                return self._request(method, url, version, headers, **kwargs)
+            except ks_exceptions.NotAcceptable:
+                # A microversion taken from the cache is not supported by
+                # the server (anymore), e.g. after a downgrade. Probe the
+                # server again and retry the request once.
+                if version is not None or not self._version_from_cache:
+                    raise
+                LOG.debug('Cached microversion %s rejected by server, '
+                          'negotiating again', self.api_version)
+                self.negotiate_api_version(self._requested_api_version,
+                                           use_cache=False)
+                return self._request(method, url, version, headers, **kwargs)
+
+    def get_json(self, url, **kwargs):
+        """GET url and return the decoded JSON body."""
+        return _parse_json(self.request('GET', url, **kwargs))
+
+    def request_many(self, specs, **kwargs):
+        """Issue independent requests concurrently.
+
+        :param specs: a list of (method, url) tuples
+        :param kwargs: keyword arguments passed to every request
+        :return: a list of responses in the order of specs
+
+        The requests share the keep-alive connection pool of the session.
+        If any of them fails, the first error (in the order of specs) is
+        raised.
+        """
+        if len(specs) <= 1:
+            return [self.request(method, url, **kwargs)
+                    for method, url in specs]
+
+        futures = self.map_concurrently(
+            lambda spec: self.request(*spec, **kwargs), specs)
+        return [f.result() for f in futures]
+
+    def get_json_many(self, urls, **kwargs):
+        """GET urls concurrently and return the decoded JSON bodies.
+
+        The bodies are returned in the order of urls, see request_many.
+        """
+        return [_parse_json(resp) for resp in
+                self.request_many([('GET', url) for url in urls], **kwargs)]
+
+    def map_concurrently(self, func, items):
+        """Call func for every item on a bounded thread pool.
+
+        :param func: a callable taking a single item, e.g. issuing one or
+                     more requests with this client
+        :param items: a list of items
+        :return: a list of completed futures in the order of items
+
+        Errors are not raised but kept in the futures, so callers can
+        decide how to handle a partial failure.
+        """
+        workers = max(1, min(MAX_CONCURRENT_REQUESTS, len(items)))
+        with concurrent.futures.ThreadPoolExecutor(workers) as executor:
+            return [executor.submit(func, item) for item in items]
+
+    def _request(self, method, url, version, headers, **kwargs):
         api_version = (self.ks_filter['service_type'] + ' '
                        + (version or self.api_version))
-        headers = kwargs.pop('headers', {})
+        headers = dict(headers)
         headers.setdefault('OpenStack-API-Version', api_version)
         headers.setdefault('Accept', 'application/json')
 
-        with _wrap_http_exceptions():
-            return self.session.request(url, method,
-                                        headers=headers,
-                                        endpoint_filter=self.ks_filter,
-                                        **kwargs)
+        return self.session.request(url, method,
+                                    headers=headers,
+                                    endpoint_filter=self.ks_filter,
+                                    **kwargs)
+
+    def _version_cache_key(self):
+        try:
+            endpoint = self.session.get_endpoint(**self.ks_filter)
+        except ks_catalog.CatalogException:
+            # Let the actual request report endpoint lookup failures.
+            return None
+        if not isinstance(endpoint, str):
+            return None
+        # The negotiated version is bounded by the client side maximum, so
+        # different releases of this plugin must not share an entry.
+        return ' '.join([self.ks_filter['service_type'], endpoint,
+                         version.MAX_VERSION_NO_GAP])
 
-    def negotiate_api_version(self, api_version):
+    def negotiate_api_version(self, api_version, use_cache=True):
         """Set api_version to self.
 
         If negotiate version (only majorversion) is given, talk to server to
         pick up max microversion supported both by client and by server.
+        The result is cached on disk for VERSION_CACHE_TTL seconds per
+        endpoint, so the server is only probed when the cache is stale or
+        the cached version gets rejected. Only the client maximum is reused
+        from the cache; a lower, fallback version is probed again, so it
+        does not stay pinned after the server gets upgraded.
         """
+        self._version_from_cache = False
         if api_version not in version.NEGOTIATE_VERSIONS:
             self.api_version = api_version
             return
+
+        cache_key = self._version_cache_key()
+        if cache_key is not None:
+            cache = _load_version_cache()
+            entry = cache.get(cache_key)
+            if (use_cache and _cache_entry_fresh(entry, time.time())
+                    and entry['version'] == version.MAX_VERSION_NO_GAP):
+                self.api_version = entry['version']
+                self._version_from_cache = True
+                LOG.debug('Using cached microversion %s', self.api_version)
+                return
+
         client_ver = version.MAX_VERSION_NO_GAP
         self.api_version = client_ver
         resp = self.request('GET', '/', raise_exc=False)
         if resp.status_code == 406:
-            server_ver = resp.json()['errors'][0]['max_version']
+            server_ver = _parse_json(resp)['errors'][0]['max_version']
             self.api_version = server_ver
             LOG.debug('Microversion %s not supported in server. '
                       'Falling back to microversion %s',
                       client_ver, server_ver)
+
+        if cache_key is not None:
+            now = time.time()
+            # Drop expired entries, e.g. of old endpoints or releases of
+            # this plugin, so the file does not grow forever.
+            cache = {key: entry for key, entry in cache.items()
+                     if _cache_entry_fresh(entry, now)}
+            cache[cache_key] = {'version': self.api_version,
+                                'timestamp': now}
+            _save_version_cache(cache)
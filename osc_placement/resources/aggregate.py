@@ -12,10 +12,11 @@
 
 from osc_lib.command import command
 from osc_lib import exceptions
+
+from osc_placement import http as placement_http
 from osc_placement import version
 
 
-BASE_URL = '/resource_providers/{uuid}/aggregates'
 FIELDS = ('uuid',)
 
 
@@ -66,32 +67,37 @@ class SetAggregate(command.Lister, version.CheckerMixin):
     def take_action(self, parsed_args):
         http = self.app.client_manager.placement
 
-        url = BASE_URL.format(uuid=parsed_args.uuid)
+        url = f'/resource_providers/{parsed_args.uuid}/aggregates'
         aggregate = parsed_args.aggregate
         generation = None
-        if 'generation' in parsed_args and parsed_args.generation is not None:
+        if parsed_args.generation is not None:
             self.check_version(version.ge('1.19'))
             generation = parsed_args.generation
 
         if self.compare_version(version.lt('1.19')):
-            resp = http.request('PUT', url, json=aggregate).json()
+            resp = http.request('PUT', url, json=aggregate)
         # Microversion 1.19 and beyond a generation argument is
         # required to write aggregates.
         elif generation is not None:
             data = {'aggregates': aggregate,
                     'resource_provider_generation': generation}
-            resp = http.request('PUT', url, json=data).json()
+            resp = http.request('PUT', url, json=data)
         else:
             raise exceptions.CommandError(
                 'A generation must be specified.')
 
-        return FIELDS, [[r] for r in resp['aggregates']]
+        aggregates = placement_http._parse_json(resp)['aggregates']
+        return FIELDS, [[r] for r in aggregates]
 
 
 class ListAggregate(command.Lister):
 
     """List resource provider aggregates.
 
+    If more than one resource provider is given, the aggregates of all of
+    them are listed and a ``resource_provider`` column is added to tell
+    them apart.
+
     This command requires at least ``--os-placement-api-version 1.1``.
     """
 
@@ -101,7 +107,8 @@ class ListAggregate(command.Lister):
         parser.add_argument(
             'uuid',
             metavar='<uuid>',
-            help='UUID of the resource provider'
+            nargs='+',
+            help='UUID of the resource provider. May be repeated.'
         )
 
         return parser
@@ -110,6 +117,15 @@ class ListAggregate(command.Lister):
     def take_action(self, parsed_args):
         http = self.app.client_manager.placement
 
-        url = BASE_URL.format(uuid=parsed_args.uuid)
-        resp = http.request('GET', url).json()
-        return FIELDS, [[r] for r in resp['aggregates']]
+        if len(parsed_args.uuid) == 1:
+            url = f'/resource_providers/{parsed_args.uuid[0]}/aggregates'
+            resp = http.get_json(url)
+            return FIELDS, [[r] for r in resp['aggregates']]
+
+        bodies = http.get_json_many(
+            [f'/resource_providers/{uuid}/aggregates'
+             for uuid in parsed_args.uuid])
+        rows = [[uuid, r]
+                for uuid, body in zip(parsed_args.uuid, bodies)
+                for r in body['aggregates']]
+        return ('resource_provider',) + FIELDS, rows
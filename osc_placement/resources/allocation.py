@@ -10,41 +10,86 @@
 # License for the specific language governing permissions and limitations
 # under the License.
 
+import copy
+import operator
+
 from osc_lib.command import command
 from osc_lib import exceptions
-from osc_lib import utils
 
 from osc_placement import version
 
 
-BASE_URL = '/allocations'
+# Microversion comparators.
+_GE_18 = version.ge('1.8')
+_GE_112 = version.ge('1.12')
+_GE_128 = version.ge('1.28')
+_GE_138 = version.ge('1.38')
+
+_FIELDS_BASE = ('resource_provider', 'generation', 'resources')
+_FIELDS_112 = _FIELDS_BASE + ('project_id', 'user_id')
+_FIELDS_138 = _FIELDS_112 + ('consumer_type',)
 
 
 def parse_allocations(allocation_strings):
     allocations = {}
     for allocation_string in allocation_strings:
-        if '=' not in allocation_string or ',' not in allocation_string:
-            raise ValueError('Incorrect allocation string format')
-        parsed = dict(kv.split('=') for kv in allocation_string.split(','))
-        if 'rp' not in parsed:
+        rp = None
+        resources = {}
+        for piece in allocation_string.split(','):
+            key, sep, value = piece.partition('=')
+            if not (key and sep and value) or '=' in value:
+                raise ValueError('Incorrect allocation string format: '
+                                 f'{allocation_string!r}')
+            if key == 'rp':
+                rp = value
+            else:
+                try:
+                    resources[key] = int(value)
+                except ValueError:
+                    raise ValueError('Incorrect allocation string format: '
+                                     f'{allocation_string!r}') from None
+        # At least two comma separated key=value pairs are required.
+        if len(resources) + (rp is not None) < 2:
+            raise ValueError('Incorrect allocation string format: '
+                             f'{allocation_string!r}')
+        if rp is None:
             raise ValueError('Resource provider parameter is required '
-                             'for allocation string')
-        resources = {k: int(v) for k, v in parsed.items() if k != 'rp'}
-        if parsed['rp'] not in allocations:
-            allocations[parsed['rp']] = resources
-        else:
-            prev_rp = allocations[parsed['rp']]
-            for resource, value in resources.items():
-                if resource in prev_rp and prev_rp[resource] != value:
+                             f'for allocation string {allocation_string!r}')
+        prev_rp = allocations.setdefault(rp, resources)
+        if prev_rp is not resources:
+            # Only resource classes given for the provider before can
+            # conflict.
+            for resource in prev_rp.keys() & resources.keys():
+                if prev_rp[resource] != resources[resource]:
                     raise exceptions.CommandError(
                         'Conflict detected for '
                         'resource provider {} resource class {}'.format(
-                            parsed['rp'], resource))
-            allocations[parsed['rp']].update(resources)
+                            rp, resource))
+            prev_rp.update(resources)
     return allocations
 
 
-class SetAllocation(command.Lister, version.CheckerMixin):
+class _AllocationRowsMixin(version.CheckerMixin):
+    def _build_rows(self, resp):
+        """Build the output of the allocations of a consumer."""
+
+        props = {}
+        fields = _FIELDS_BASE
+        if self.compare_version(_GE_112):
+            fields = _FIELDS_112
+            props['project_id'] = resp.get('project_id')
+            props['user_id'] = resp.get('user_id')
+        if self.compare_version(_GE_138):
+            fields = _FIELDS_138
+            props['consumer_type'] = resp.get('consumer_type')
+
+        getter = operator.itemgetter(*fields)
+        rows = (getter({'resource_provider': k, **props, **v})
+                for k, v in resp['allocations'].items())
+        return fields, rows
+
+
+class SetAllocation(command.Lister, _AllocationRowsMixin):
     """Replaces the set of resource allocation(s) for a given consumer.
 
     Note that this is a full replacement of the existing allocations. If you
@@ -71,6 +116,7 @@ class SetAllocation(command.Lister, version.CheckerMixin):
 
     def get_parser(self, prog_name):
         parser = super(SetAllocation, self).get_parser(prog_name)
+        requires_1_8 = self.compare_version(_GE_18)
 
         parser.add_argument(
             'uuid',
@@ -92,7 +138,7 @@ class SetAllocation(command.Lister, version.CheckerMixin):
             help='ID of the consuming project. '
                  'This option is required starting from '
                  '``--os-placement-api-version 1.8``.',
-            required=self.compare_version(version.ge('1.8'))
+            required=requires_1_8
         )
         parser.add_argument(
             '--user-id',
@@ -100,7 +146,7 @@ class SetAllocation(command.Lister, version.CheckerMixin):
             help='ID of the consuming user. '
                  'This option is required starting from '
                  '``--os-placement-api-version 1.8``.',
-            required=self.compare_version(version.ge('1.8'))
+            required=requires_1_8
         )
         parser.add_argument(
             '--consumer-type',
@@ -108,27 +154,30 @@ class SetAllocation(command.Lister, version.CheckerMixin):
             help='The type of the consumer. '
                  'This option is required starting from '
                  '``--os-placement-api-version 1.38``.',
-            required=self.compare_version(version.ge('1.38'))
+            required=self.compare_version(_GE_138)
         )
         return parser
 
     def take_action(self, parsed_args):
         http = self.app.client_manager.placement
-        url = BASE_URL + '/' + parsed_args.uuid
-
-        # Determine if we need to honor consumer generations.
-        supports_consumer_generation = self.compare_version(version.ge('1.28'))
-        if supports_consumer_generation:
-            # Get the existing consumer generation via GET.
-            payload = http.request('GET', url).json()
-            consumer_generation = payload.get('consumer_generation')
+        url = f'/allocations/{parsed_args.uuid}'
 
+        # Validate the input before talking to the server.
         allocations = parse_allocations(parsed_args.allocation)
         if not allocations:
             raise exceptions.CommandError(
                 'At least one resource allocation must be specified')
 
-        if self.compare_version(version.ge('1.12')):
+        supports_1_12 = self.compare_version(_GE_112)
+        supports_1_38 = self.compare_version(_GE_138)
+        # Determine if we need to honor consumer generations.
+        supports_consumer_generation = self.compare_version(_GE_128)
+        if supports_consumer_generation:
+            # Get the existing consumer generation via GET.
+            payload = http.get_json(url)
+            consumer_generation = payload.get('consumer_generation')
+
+        if supports_1_12:
             allocations = {
                 rp: {'resources': resources}
                 for rp, resources in allocations.items()}
@@ -142,40 +191,28 @@ class SetAllocation(command.Lister, version.CheckerMixin):
         # first set of allocations the consumer_generation will be None.
         if supports_consumer_generation:
             payload['consumer_generation'] = consumer_generation
-        if self.compare_version(version.ge('1.8')):
+        if self.compare_version(_GE_18):
             payload['project_id'] = parsed_args.project_id
             payload['user_id'] = parsed_args.user_id
         elif parsed_args.project_id or parsed_args.user_id:
             self.log.warning('--project-id and --user-id options do not '
                              'affect allocation for '
                              '--os-placement-api-version less than 1.8')
-        if self.compare_version(version.ge('1.38')):
+        if supports_1_38:
             payload['consumer_type'] = parsed_args.consumer_type
         elif parsed_args.consumer_type:
             self.log.warning('--consumer-type option does not affect '
                              'allocation for --os-placement-api-version less '
                              'than 1.38')
         http.request('PUT', url, json=payload)
-        resp = http.request('GET', url).json()
-        per_provider = resp['allocations'].items()
-        props = {}
-
-        fields = ('resource_provider', 'generation', 'resources')
-        if self.compare_version(version.ge('1.12')):
-            fields += ('project_id', 'user_id')
-            props['project_id'] = resp['project_id']
-            props['user_id'] = resp['user_id']
-        if self.compare_version(version.ge('1.38')):
-            fields += ('consumer_type',)
-            props['consumer_type'] = resp['consumer_type']
-
-        allocs = [dict(resource_provider=k, **props, **v)
-                  for k, v in per_provider]
-        rows = (utils.get_dict_properties(a, fields) for a in allocs)
-        return fields, rows
+        # NOTE: PUT /allocations/{consumer_uuid} answers 204 without a body
+        # and the output reports the resource provider generations, which
+        # the client cannot derive from the request, so read them back.
+        resp = http.get_json(url)
+        return self._build_rows(resp)
 
 
-class UnsetAllocation(command.Lister, version.CheckerMixin):
+class UnsetAllocation(command.Lister, _AllocationRowsMixin):
     """Removes one or more sets of provider allocations for a consumer.
 
     Note that omitting both the ``--provider`` and the ``--resource-class``
@@ -237,25 +274,30 @@ class UnsetAllocation(command.Lister, version.CheckerMixin):
     @version.check(version.ge('1.12'))
     def take_action(self, parsed_args):
         http = self.app.client_manager.placement
-        url = BASE_URL + '/' + parsed_args.uuid
+        url = f'/allocations/{parsed_args.uuid}'
 
         # Get the current allocations.
-        payload = http.request('GET', url).json()
+        payload = http.get_json(url)
         allocations = payload['allocations']
+        original = copy.deepcopy(allocations)
 
         if parsed_args.resource_class:
             # Remove the given resource class. Do not error out if the
             # consumer does not have allocations against that resource
             # class.
-            rp_uuids = set(allocations)
             if parsed_args.provider:
                 # If providers are also specified, we limit to remove
                 # allocations only from those providers
-                rp_uuids &= set(parsed_args.provider)
+                rp_uuids = [rp_uuid
+                            for rp_uuid in dict.fromkeys(parsed_args.provider)
+                            if rp_uuid in allocations]
+            else:
+                rp_uuids = list(allocations)
             for rp_uuid in rp_uuids:
+                resources = allocations[rp_uuid]['resources']
                 for rc in parsed_args.resource_class:
-                    allocations[rp_uuid]['resources'].pop(rc, None)
-                if not allocations[rp_uuid]['resources']:
+                    resources.pop(rc, None)
+                if not resources:
                     allocations.pop(rp_uuid, None)
         else:
             if parsed_args.provider:
@@ -271,7 +313,13 @@ class UnsetAllocation(command.Lister, version.CheckerMixin):
                 # providers.
                 allocations = {}
 
-        supports_consumer_generation = self.compare_version(version.ge('1.28'))
+        if allocations and allocations == original:
+            # Nothing to remove, e.g. we lost a race or the provider or
+            # resource class is not allocated at all, so the allocations we
+            # just read are still current.
+            return self._build_rows(payload)
+
+        supports_consumer_generation = self.compare_version(_GE_128)
         # 1.28+ allows PUTing an empty allocations dict as long as a
         # consumer_generation is specified.
         if allocations or supports_consumer_generation:
@@ -283,23 +331,11 @@ class UnsetAllocation(command.Lister, version.CheckerMixin):
             # dict before 1.28.
             http.request('DELETE', url)
 
-        resp = http.request('GET', url).json()
-        per_provider = resp['allocations'].items()
-        props = {}
-
-        fields = ('resource_provider', 'generation', 'resources',
-                  'project_id', 'user_id')
-        if self.compare_version(version.ge('1.38')):
-            fields += ('consumer_type',)
-            props['consumer_type'] = resp.get('consumer_type')
-        allocs = [dict(project_id=resp['project_id'], user_id=resp['user_id'],
-                       resource_provider=k, **props, **v)
-                  for k, v in per_provider]
-        rows = (utils.get_dict_properties(a, fields) for a in allocs)
-        return fields, rows
+        resp = http.get_json(url)
+        return self._build_rows(resp)
 
 
-class ShowAllocation(command.Lister, version.CheckerMixin):
+class ShowAllocation(command.Lister, _AllocationRowsMixin):
     """Show resource allocations for a given consumer.
 
     Starting with ``--os-placement-api-version 1.12`` the API response contains
@@ -324,25 +360,9 @@ class ShowAllocation(command.Lister, version.CheckerMixin):
     def take_action(self, parsed_args):
         http = self.app.client_manager.placement
 
-        url = BASE_URL + '/' + parsed_args.uuid
-        resp = http.request('GET', url).json()
-        per_provider = resp['allocations'].items()
-        props = {}
-
-        fields = ('resource_provider', 'generation', 'resources')
-        if self.compare_version(version.ge('1.12')):
-            fields += ('project_id', 'user_id')
-            props['project_id'] = resp.get('project_id')
-            props['user_id'] = resp.get('user_id')
-        if self.compare_version(version.ge('1.38')):
-            fields += ('consumer_type',)
-            props['consumer_type'] = resp.get('consumer_type')
-
-        allocs = [dict(resource_provider=k, **props, **v)
-                  for k, v in per_provider]
-
-        rows = (utils.get_dict_properties(a, fields) for a in allocs)
-        return fields, rows
+        url = f'/allocations/{parsed_args.uuid}'
+        resp = http.get_json(url)
+        return self._build_rows(resp)
 
 
 class DeleteAllocation(command.Command):
@@ -362,5 +382,5 @@ class DeleteAllocation(command.Command):
     def take_action(self, parsed_args):
         http = self.app.client_manager.placement
 
-        url = BASE_URL + '/' + parsed_args.uuid
+        url = f'/allocations/{parsed_args.uuid}'
         http.request('DELETE', url)
@@ -11,7 +11,7 @@
 # under the License.
 
 import argparse
-import collections
+import re
 
 from osc_lib.command import command
 from osc_lib import exceptions
@@ -21,6 +21,28 @@ from osc_placement import version
 
 
 BASE_URL = '/allocation_candidates'
+# <resource_class>=<value>, with exactly one '='.
+_RESOURCE_RE = re.compile(r'[^=]*=[^=]*')
+
+# Microversion comparators.
+_GE_112 = version.ge('1.12')
+_GE_116 = version.ge('1.16')
+_GE_117 = version.ge('1.17')
+_GE_121 = version.ge('1.21')
+_GE_122 = version.ge('1.22')
+_GE_125 = version.ge('1.25')
+_GE_139 = version.ge('1.39')
+
+
+class _Group(object):
+    """Options given for one (possibly unnamed) request group."""
+
+    __slots__ = ('resources', 'required', 'forbidden', 'member_of',
+                 'aggregate_uuid')
+
+    def __init__(self):
+        for name in self.__slots__:
+            setattr(self, name, [])
 
 
 class GroupAction(argparse.Action):
@@ -28,7 +50,7 @@ class GroupAction(argparse.Action):
         group, = values
         namespace._current_group = group
         groups = namespace.__dict__.setdefault('groups', {})
-        groups[group] = collections.defaultdict(list)
+        groups[group] = _Group()
 
 
 class AppendToGroup(argparse.Action):
@@ -36,8 +58,9 @@ class AppendToGroup(argparse.Action):
         if getattr(namespace, '_current_group', None) is None:
             groups = namespace.__dict__.setdefault('groups', {})
             namespace._current_group = ''
-            groups[''] = collections.defaultdict(list)
-        namespace.groups[namespace._current_group][self.dest].append(values)
+            groups[''] = _Group()
+        group = namespace.groups[namespace._current_group]
+        getattr(group, self.dest).append(values)
 
 
 class ListAllocationCandidate(command.Lister, version.CheckerMixin):
@@ -180,105 +203,116 @@ class ListAllocationCandidate(command.Lister, version.CheckerMixin):
         http = self.app.client_manager.placement
 
         params = {}
-        if 'groups' not in parsed_args:
+        groups = getattr(parsed_args, 'groups', None)
+        if groups is None:
             raise exceptions.CommandError(
                 'At least one --resource must be specified.')
 
-        if 'limit' in parsed_args and parsed_args.limit:
+        limit = getattr(parsed_args, 'limit', None)
+        if limit:
             # Fail if --limit but not high enough microversion.
-            self.check_version(version.ge('1.16'))
-            params['limit'] = int(parsed_args.limit)
+            self.check_version(_GE_116)
+            params['limit'] = int(limit)
 
-        if any(parsed_args.groups):
-            self.check_version(version.ge('1.25'))
+        if any(groups):
+            self.check_version(_GE_125)
             params['group_policy'] = parsed_args.group_policy
 
-        for suffix, group in parsed_args.groups.items():
-            def _get_key(name):
-                return name + suffix
-
-            if 'resources' not in group:
+        for suffix, group in groups.items():
+            if not group.resources:
                 raise exceptions.CommandError(
                     '--resources should be provided in group %s', suffix)
-            for resource in group['resources']:
-                if not len(resource.split('=')) == 2:
+            for resource in group.resources:
+                if not _RESOURCE_RE.fullmatch(resource):
                     raise exceptions.CommandError(
                         'Arguments to --resource must be of form '
                         '<resource_class>=<value>')
 
-            params[_get_key('resources')] = ','.join(
-                resource.replace('=', ':') for resource in group['resources'])
+            params['resources' + suffix] = common.parse_filter_resources(
+                group.resources)
 
             # We need to handle required and forbidden together as they all
             # end up in the same query param on the API.
             # First just check that the requested feature is aligned with the
             # request microversion
             required_traits = []
-            if 'required' in group and group['required']:
+            if group.required:
                 # Fail if --required but not high enough microversion.
-                self.check_version(version.ge('1.17'))
-                if any(',' in required for required in group['required']):
-                    self.check_version(version.ge('1.39'))
-                required_traits = group['required']
+                self.check_version(_GE_117)
+                if any(',' in required for required in group.required):
+                    self.check_version(_GE_139)
+                required_traits = group.required
 
             forbidden_traits = []
-            if 'forbidden' in group and group['forbidden']:
-                self.check_version(version.ge('1.22'))
-                forbidden_traits = ['!' + f for f in group['forbidden']]
+            if group.forbidden:
+                self.check_version(_GE_122)
+                forbidden_traits = ['!' + f for f in group.forbidden]
 
             # Then collect the required query params containing both required
             # and forbidden traits
-            params[_get_key('required')] = (
+            params['required' + suffix] = (
                 common.get_required_query_param_from_args(
                     required_traits, forbidden_traits)
             )
 
-            if 'aggregate_uuid' in group and group['aggregate_uuid']:
+            if group.aggregate_uuid:
                 # Fail if --aggregate_uuid but not high enough microversion.
-                self.check_version(version.ge('1.21'))
+                self.check_version(_GE_121)
                 self.deprecated_option_warning(
                     "--aggregate-uuid", "--member-of")
-                params[_get_key('member_of')] = 'in:' + ','.join(
-                    group['aggregate_uuid'])
-            if 'member_of' in group and group['member_of']:
+                params['member_of' + suffix] = (
+                    f"in:{','.join(group.aggregate_uuid)}")
+            if group.member_of:
                 # Fail if --member-of but not high enough microversion.
-                self.check_version(version.ge('1.21'))
-                params[_get_key('member_of')] = [
-                    'in:' + aggs for aggs in group['member_of']]
+                self.check_version(_GE_121)
+                params['member_of' + suffix] = [
+                    f'in:{aggs}' for aggs in group.member_of]
 
-        resp = http.request('GET', BASE_URL, params=params).json()
+        resp = http.get_json(BASE_URL, params=params)
 
+        include_traits = self.compare_version(_GE_117)
+        # Only format the summaries of providers that show up in an
+        # allocation request, and each of them only once.
+        summaries = resp['provider_summaries']
         rp_resources = {}
-        include_traits = self.compare_version(version.ge('1.17'))
-        if include_traits:
-            rp_traits = {}
-        for rp_uuid, resources in resp['provider_summaries'].items():
-            rp_resources[rp_uuid] = ','.join(
-                '%s=%s/%s' % (rc, value['used'], value['capacity'])
-                for rc, value in resources['resources'].items())
-            if include_traits:
-                rp_traits[rp_uuid] = ','.join(resources['traits'])
+        rp_traits = {}
+
+        def _format_resources(rp):
+            if rp not in rp_resources:
+                rp_resources[rp] = ','.join([
+                    f"{rc}={value['used']}/{value['capacity']}"
+                    for rc, value in summaries[rp]['resources'].items()])
+            return rp_resources[rp]
+
+        def _format_traits(rp):
+            if rp not in rp_traits:
+                rp_traits[rp] = ','.join(summaries[rp]['traits'])
+            return rp_traits[rp]
 
         rows = []
-        if self.compare_version(version.ge('1.12')):
-            for i, allocation_req in enumerate(resp['allocation_requests']):
+        append = rows.append
+        if self.compare_version(_GE_112):
+            for i, allocation_req in enumerate(
+                    resp['allocation_requests'], start=1):
                 for rp, resources in allocation_req['allocations'].items():
-                    req = ','.join(
-                        '%s=%s' % (rc, value)
-                        for rc, value in resources['resources'].items())
+                    req = ','.join([
+                        f'{rc}={value}'
+                        for rc, value in resources['resources'].items()])
                     if include_traits:
-                        row = [i + 1, req, rp, rp_resources[rp], rp_traits[rp]]
+                        row = (i, req, rp, _format_resources(rp),
+                               _format_traits(rp))
                     else:
-                        row = [i + 1, req, rp, rp_resources[rp]]
-                    rows.append(row)
+                        row = (i, req, rp, _format_resources(rp))
+                    append(row)
         else:
-            for i, allocation_req in enumerate(resp['allocation_requests']):
+            for i, allocation_req in enumerate(
+                    resp['allocation_requests'], start=1):
                 for allocation in allocation_req['allocations']:
                     rp = allocation['resource_provider']['uuid']
-                    req = ','.join(
-                        '%s=%s' % (rc, value)
-                        for rc, value in allocation['resources'].items())
-                    rows.append([i + 1, req, rp, rp_resources[rp]])
+                    req = ','.join([
+                        f'{rc}={value}'
+                        for rc, value in allocation['resources'].items()])
+                    append((i, req, rp, _format_resources(rp)))
 
         fields = ('#', 'allocation', 'resource provider',
                   'inventory used/capacity')
@@ -10,34 +10,45 @@
 # License for the specific language governing permissions and limitations
 # under the License.
 
+import itertools
 from urllib import parse as urlparse
 
 
-def encode(value, encoding='utf-8'):
-    """Return a byte repr of a string for a given encoding.
+def row_getter(fields):
+    """Return a callable building an output row of fields from a dict.
 
-    Byte strings and values of other types are returned as is.
+    Missing fields are output as empty strings, like
+    osc_lib.utils.get_dict_properties() does.
 
     """
 
-    if isinstance(value, str):
-        return value.encode(encoding)
-    else:
-        return value
+    def getter(item):
+        return tuple(item.get(f, '') for f in fields)
+    return getter
 
 
 def url_with_filters(url, filters=None):
     """Add a percent-encoded string of filters (a dict) to a base url."""
 
     if filters:
-        filters = [(encode(k), encode(v)) for k, v in filters.items()]
-
+        # urlencode() UTF-8 encodes str keys and values itself.
         urlencoded_filters = urlparse.urlencode(filters)
-        url = urlparse.urljoin(url, '?' + urlencoded_filters)
+        sep = '&' if '?' in url else '?'
+        url = url + sep + urlencoded_filters
 
     return url
 
 
+# Turns <resource_class>=<value> into the <resource_class>:<value> query form.
+_RESOURCE_TO_QUERY = str.maketrans('=', ':')
+
+
+def parse_filter_resources(resources):
+    """Return the resources query param for <resource_class>=<value> args."""
+
+    return ','.join([r.translate(_RESOURCE_TO_QUERY) for r in resources])
+
+
 def get_required_query_param_from_args(required_traits, forbidden_traits):
     # Iterate the required params and collect OR groups and simple
     # AND traits separately. Each OR group needs a separate query param
@@ -52,7 +63,7 @@ def get_required_query_param_from_args(required_traits, forbidden_traits):
             and_traits.append(required)
     # We need an extra required query param for the and_traits and the
     # forbidden traits
-    and_query = ','.join(and_traits + forbidden_traits)
+    and_query = ','.join(itertools.chain(and_traits, forbidden_traits))
     if and_query:
         required_query_params.append(and_query)
     return required_query_params
@@ -10,14 +10,12 @@
 # License for the specific language governing permissions and limitations
 # under the License.
 
-import collections
 import itertools
 
 from osc_lib.command import command
 from osc_lib import exceptions
 from osc_lib.i18n import _
 from osc_lib import utils
-from oslo_utils import excutils
 
 from osc_placement.resources import common
 from osc_placement import version
@@ -71,31 +69,31 @@ INVENTORY_FIELDS = {
     }
 }
 FIELDS = tuple(INVENTORY_FIELDS.keys())
+_FIELD_TYPES = {k: v['type'] for k, v in INVENTORY_FIELDS.items()}
+_FIELDS_HELP = '\n'.join(
+    '{} - {}'.format(f, INVENTORY_FIELDS[f]['help'].lower())
+    for f in INVENTORY_FIELDS)
 RC_HELP = ('<resource_class> is an entity that indicates standard or '
            'deployer-specific resources that can be provided by a resource '
            'provider. For example, VCPU, MEMORY_MB, DISK_GB.')
 
 
 def parse_resource_argument(resource):
-    parts = resource.split('=')
-    if len(parts) != 2:
+    name, sep, value = resource.partition('=')
+    if not sep or '=' in value:
         raise ValueError(
             'Resource argument must have "name=value" format')
-    name, value = parts
-    parts = name.split(':')
-    if len(parts) == 2:
-        name, field = parts
-    elif len(parts) == 1:
-        name = parts[0]
+    name, colon, field = name.partition(':')
+    if not colon:
         field = 'total'
-    else:
+    elif ':' in field:
         raise ValueError('Resource argument can contain only one colon')
     if not all([name, field, value]):
         raise ValueError('Name, field and value must be not empty')
-    if field not in INVENTORY_FIELDS:
+    field_type = _FIELD_TYPES.get(field)
+    if field_type is None:
         raise ValueError('Unknown inventory field %s' % field)
-    value = INVENTORY_FIELDS[field]['type'](value)
-    return name, field, value
+    return name, field, field_type(value)
 
 
 class SetInventory(command.Lister, version.CheckerMixin):
@@ -111,6 +109,9 @@ class SetInventory(command.Lister, version.CheckerMixin):
     it is assumed to be the total, i.e. ``--resource VCPU=16`` is equivalent to
     ``--resource VCPU:total=16``.
 
+    Removing all inventory of a resource provider by not specifying any
+    ``--resource`` requires the ``--clear`` option.
+
     Example::
 
         openstack resource provider inventory set <uuid> \
@@ -128,14 +129,11 @@ class SetInventory(command.Lister, version.CheckerMixin):
             help='UUID of the resource provider or UUID of the aggregate, '
                  'if --aggregate is specified'
         )
-        fields_help = '\n'.join(
-            '{} - {}'.format(f, INVENTORY_FIELDS[f]['help'].lower())
-            for f in INVENTORY_FIELDS)
         parser.add_argument(
             '--resource',
             metavar='<resource_class>:<inventory_field>=<value>',
             help='String describing resource.\n' + RC_HELP + '\n'
-                 '<inventory_field> (optional) can be:\n' + fields_help,
+                 '<inventory_field> (optional) can be:\n' + _FIELDS_HELP,
             default=[],
             action='append'
         )
@@ -160,6 +158,14 @@ class SetInventory(command.Lister, version.CheckerMixin):
                  'set will be returned without actually setting any '
                  'inventories'
         )
+        parser.add_argument(
+            '--clear',
+            action='store_true',
+            help='Remove all inventories of the resource provider(s). '
+                 'Cannot be combined with --resource or --amend. Without '
+                 'this option, specifying no --resource is an error unless '
+                 '--amend or --dry-run is specified'
+        )
 
         return parser
 
@@ -167,56 +173,79 @@ class SetInventory(command.Lister, version.CheckerMixin):
 
         http = self.app.client_manager.placement
 
+        if parsed_args.clear and (parsed_args.resource or parsed_args.amend):
+            raise exceptions.CommandError(
+                '--clear cannot be used with --resource or --amend.')
+        if not (parsed_args.resource or parsed_args.amend
+                or parsed_args.dry_run or parsed_args.clear):
+            raise exceptions.CommandError(
+                'No --resource specified. Use --clear to remove all '
+                'inventories.')
+
         if parsed_args.aggregate:
             self.check_version(version.ge('1.3'))
             filters = {'member_of': parsed_args.uuid}
             url = common.url_with_filters(RP_BASE_URL, filters)
-            rps = http.request('GET', url).json()['resource_providers']
+            rps = http.get_json(url)['resource_providers']
             if not rps:
                 raise exceptions.CommandError(
                     'No resource providers found in aggregate with uuid %s.' %
                     parsed_args.uuid)
+        elif parsed_args.amend:
+            # The existing inventories are read anyway and come with the
+            # resource provider generation, so the provider is not needed.
+            rps = [{'uuid': parsed_args.uuid}]
         else:
             url = RP_BASE_URL + '/' + parsed_args.uuid
             rps = [http.request('GET', url).json()]
 
-        resources_list = []
-        ret = 0
-        for rp in rps:
-            inventories = collections.defaultdict(dict)
+        # Parse the resource arguments once for all resource providers.
+        new_inventories = {}
+        for r in parsed_args.resource:
+            name, field, value = parse_resource_argument(r)
+            new_inventories.setdefault(name, {})[field] = value
+
+        def set_inventories(rp):
             url = BASE_URL.format(uuid=rp['uuid'])
             if parsed_args.amend:
-                # Get existing inventories
+                # Get existing inventories. With --aggregate a failing GET
+                # (example: resource provider deleted from underneath us) is
+                # reported as a failure of that resource provider only.
                 # TODO(melwitt): Do something to handle the possibility of the
-                # GET failing here (example: resource provider deleted from
-                # underneath us).
+                # GET failing here for a single resource provider.
                 payload = http.request('GET', url).json()
-                inventories.update(payload['inventories'])
-                payload['inventories'] = inventories
+                inventories = payload['inventories']
             else:
+                inventories = {}
                 payload = {'inventories': inventories,
                            'resource_provider_generation': rp['generation']}
 
             # Apply resource values to inventories
-            for r in parsed_args.resource:
-                name, field, value = parse_resource_argument(r)
-                inventories[name][field] = value
-
-            try:
-                if not parsed_args.dry_run:
-                    resources = http.request('PUT', url, json=payload).json()
-                else:
-                    resources = payload
-            except Exception as exp:
-                with excutils.save_and_reraise_exception() as err_ctx:
-                    if parsed_args.aggregate:
-                        self.log.error(_('Failed to set inventory for '
-                                         'resource provider %(rp)s: %(exp)s.'),
-                                       {'rp': rp['uuid'], 'exp': exp})
-                        err_ctx.reraise = False
-                        ret += 1
-                        continue
-            resources_list.append((rp['uuid'], resources))
+            for name, fields in new_inventories.items():
+                inventories.setdefault(name, {}).update(fields)
+
+            if parsed_args.dry_run:
+                return payload
+            return http.request('PUT', url, json=payload).json()
+
+        resources_list = []
+        ret = 0
+        if not parsed_args.aggregate:
+            rp = rps[0]
+            resources_list.append((rp['uuid'], set_inventories(rp)))
+        else:
+            # The resource providers of an aggregate are independent of
+            # each other, so update them concurrently.
+            futures = http.map_concurrently(set_inventories, rps)
+            for rp, future in zip(rps, futures):
+                exp = future.exception()
+                if exp is not None:
+                    self.log.error(_('Failed to set inventory for '
+                                     'resource provider %(rp)s: %(exp)s.'),
+                                   {'rp': rp['uuid'], 'exp': exp})
+                    ret += 1
+                    continue
+                resources_list.append((rp['uuid'], future.result()))
 
         if ret > 0:
             msg = _('Failed to set inventory for %(ret)s of %(total)s '
@@ -225,25 +254,21 @@ class SetInventory(command.Lister, version.CheckerMixin):
 
         def get_rows(fields, resources, rp_uuid=None):
             inventories = [
-                dict(resource_class=k, **v)
+                {'resource_class': k, **v}
                 for k, v in resources['inventories'].items()
             ]
             prepend = (rp_uuid, ) if rp_uuid else ()
-            # This is a generator expression
-            rows = (prepend + utils.get_dict_properties(i, fields)
-                    for i in inventories)
-            return rows
+            getter = common.row_getter(fields)
+            return [prepend + getter(i) for i in inventories]
 
         fields = ('resource_class', ) + FIELDS
         if parsed_args.aggregate:
             # If this is an aggregate batch, create output that will include
             # resource provider as the first field to differentiate the values
-            rows = ()
-            for rp_uuid, resources in resources_list:
-                subrows = get_rows(fields, resources, rp_uuid=rp_uuid)
-                rows = itertools.chain(rows, subrows)
-            fields = ('resource_provider', ) + fields
-            return fields, rows
+            rows = itertools.chain.from_iterable([
+                get_rows(fields, resources, rp_uuid=rp_uuid)
+                for rp_uuid, resources in resources_list])
+            return ('resource_provider', ) + fields, rows
         else:
             # If this was not an aggregate batch, show output for the one
             # resource provider (show payload of the first item in the list),
@@ -409,7 +434,7 @@ class ListInventory(command.Lister):
         resources = http.request('GET', url).json()
 
         inventories = [
-            dict(resource_class=k, **v)
+            {'resource_class': k, **v}
             for k, v in resources['inventories'].items()
         ]
 
@@ -422,5 +447,5 @@ class ListInventory(command.Lister):
             inventory['used'] = resources[inventory['resource_class']]
 
         fields = ('resource_class', ) + FIELDS + ('used', )
-        rows = (utils.get_dict_properties(i, fields) for i in inventories)
-        return fields, rows
+        getter = common.row_getter(fields)
+        return fields, [getter(i) for i in inventories]
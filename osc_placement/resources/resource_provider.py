@@ -15,6 +15,7 @@ import argparse
 from osc_lib.command import command
 from osc_lib import utils
 
+from osc_placement import http as placement_http
 from osc_placement.resources import common
 from osc_placement import version
 
@@ -22,6 +23,18 @@ from osc_placement import version
 BASE_URL = '/resource_providers'
 ALLOCATIONS_URL = BASE_URL + '/{uuid}/allocations'
 
+# Microversion comparators.
+_GE_13 = version.ge('1.3')
+_GE_14 = version.ge('1.4')
+_GE_114 = version.ge('1.14')
+_GE_118 = version.ge('1.18')
+_GE_120 = version.ge('1.20')
+_GE_122 = version.ge('1.22')
+_GE_139 = version.ge('1.39')
+
+_FIELDS_BASE = ('uuid', 'name', 'generation')
+_FIELDS_114 = _FIELDS_BASE + ('root_provider_uuid', 'parent_provider_uuid')
+
 
 class CreateResourceProvider(command.ShowOne, version.CheckerMixin):
     """Create a new resource provider"""
@@ -55,19 +68,23 @@ class CreateResourceProvider(command.ShowOne, version.CheckerMixin):
 
         data = {'name': parsed_args.name}
 
-        if 'uuid' in parsed_args and parsed_args.uuid:
+        if parsed_args.uuid:
             data['uuid'] = parsed_args.uuid
-        if ('parent_provider' in parsed_args
-                and parsed_args.parent_provider):
-            self.check_version(version.ge('1.14'))
+        if parsed_args.parent_provider:
+            self.check_version(_GE_114)
             data['parent_provider_uuid'] = parsed_args.parent_provider
 
         resp = http.request('POST', BASE_URL, json=data)
-        resource = http.request('GET', resp.headers['Location']).json()
 
-        fields = ('uuid', 'name', 'generation')
-        if self.compare_version(version.ge('1.14')):
-            fields += ('root_provider_uuid', 'parent_provider_uuid')
+        fields = _FIELDS_114 if self.compare_version(_GE_114) else _FIELDS_BASE
+
+        # Since 1.20 the created resource provider is returned, only read it
+        # back on older microversions or if something we show is missing.
+        resource = {}
+        if self.compare_version(_GE_120) and resp.content:
+            resource = placement_http._parse_json(resp)
+        if not all(f in resource for f in fields):
+            resource = http.get_json(resp.headers['Location'])
 
         return fields, utils.get_dict_properties(resource, fields)
 
@@ -168,16 +185,15 @@ class ListResourceProvider(command.Lister, version.CheckerMixin):
         if parsed_args.uuid:
             filters['uuid'] = parsed_args.uuid
         if parsed_args.aggregate_uuid:
-            self.check_version(version.ge('1.3'))
+            self.check_version(_GE_13)
             self.deprecated_option_warning("--aggregate-uuid", "--member-of")
             filters['member_of'] = 'in:' + ','.join(parsed_args.aggregate_uuid)
         if parsed_args.resource:
-            self.check_version(version.ge('1.4'))
-            filters['resources'] = ','.join(
-                resource.replace('=', ':')
-                for resource in parsed_args.resource)
-        if 'in_tree' in parsed_args and parsed_args.in_tree:
-            self.check_version(version.ge('1.14'))
+            self.check_version(_GE_14)
+            filters['resources'] = common.parse_filter_resources(
+                parsed_args.resource)
+        if parsed_args.in_tree:
+            self.check_version(_GE_114)
             filters['in_tree'] = parsed_args.in_tree
 
         # We need to handle required and forbidden together as they all end up
@@ -185,15 +201,15 @@ class ListResourceProvider(command.Lister, version.CheckerMixin):
         # First just check that the requested feature is aligned with the
         # request microversion
         required_traits = []
-        if 'required' in parsed_args and parsed_args.required:
-            self.check_version(version.ge('1.18'))
+        if parsed_args.required:
+            self.check_version(_GE_118)
             if any(',' in required for required in parsed_args.required):
-                self.check_version(version.ge('1.39'))
+                self.check_version(_GE_139)
             required_traits = parsed_args.required
 
         forbidden_traits = []
-        if 'forbidden' in parsed_args and parsed_args.forbidden:
-            self.check_version(version.ge('1.22'))
+        if parsed_args.forbidden:
+            self.check_version(_GE_122)
             forbidden_traits = ['!' + f for f in parsed_args.forbidden]
 
         # Then collect the required query params containing both required and
@@ -201,21 +217,19 @@ class ListResourceProvider(command.Lister, version.CheckerMixin):
         filters['required'] = common.get_required_query_param_from_args(
             required_traits, forbidden_traits)
 
-        if 'member_of' in parsed_args and parsed_args.member_of:
+        if parsed_args.member_of:
             # Fail if --member-of but not high enough microversion.
-            self.check_version(version.ge('1.3'))
+            self.check_version(_GE_13)
             filters['member_of'] = [
                 'in:' + aggs for aggs in parsed_args.member_of]
 
-        resources = http.request(
-            'GET', BASE_URL, params=filters).json()['resource_providers']
+        resources = http.get_json(
+            BASE_URL, params=filters)['resource_providers']
 
-        fields = ('uuid', 'name', 'generation')
-        if self.compare_version(version.ge('1.14')):
-            fields += ('root_provider_uuid', 'parent_provider_uuid')
+        fields = _FIELDS_114 if self.compare_version(_GE_114) else _FIELDS_BASE
 
-        rows = (utils.get_dict_properties(r, fields) for r in resources)
-        return fields, rows
+        getter = common.row_getter(fields)
+        return fields, [getter(r) for r in resources]
 
 
 class ShowResourceProvider(command.ShowOne, version.CheckerMixin):
@@ -241,17 +255,18 @@ class ShowResourceProvider(command.ShowOne, version.CheckerMixin):
         http = self.app.client_manager.placement
 
         url = BASE_URL + '/' + parsed_args.uuid
-        resource = http.request('GET', url).json()
 
-        fields = ('uuid', 'name', 'generation')
-        if self.compare_version(version.ge('1.14')):
-            fields += ('root_provider_uuid', 'parent_provider_uuid')
+        fields = _FIELDS_114 if self.compare_version(_GE_114) else _FIELDS_BASE
 
         if parsed_args.allocations:
+            # The provider and its allocations are independent, fetch them
+            # concurrently.
             allocs_url = ALLOCATIONS_URL.format(uuid=parsed_args.uuid)
-            allocs = http.request('GET', allocs_url).json()['allocations']
-            resource['allocations'] = allocs
+            resource, allocs = http.get_json_many([url, allocs_url])
+            resource['allocations'] = allocs['allocations']
             fields += ('allocations',)
+        else:
+            resource = http.get_json(url)
 
         return fields, utils.get_dict_properties(resource, fields)
 
@@ -296,15 +311,12 @@ class SetResourceProvider(command.ShowOne, version.CheckerMixin):
         #     Object action update failed because:
         #     re-parenting a provider is not currently allowed.
         #     (HTTP 400)
-        if ('parent_provider' in parsed_args
-                and parsed_args.parent_provider):
-            self.check_version(version.ge('1.14'))
+        if parsed_args.parent_provider:
+            self.check_version(_GE_114)
             data['parent_provider_uuid'] = parsed_args.parent_provider
         resource = http.request('PUT', url, json=data).json()
 
-        fields = ('uuid', 'name', 'generation')
-        if self.compare_version(version.ge('1.14')):
-            fields += ('root_provider_uuid', 'parent_provider_uuid')
+        fields = _FIELDS_114 if self.compare_version(_GE_114) else _FIELDS_BASE
 
         return fields, utils.get_dict_properties(resource, fields)
 
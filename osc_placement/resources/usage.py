@@ -11,7 +11,6 @@
 # under the License.
 
 from osc_lib.command import command
-from osc_lib import utils
 
 from osc_placement import version
 
@@ -56,13 +55,10 @@ class ResourceShowUsage(command.Lister, version.CheckerMixin):
         params = {'project_id': parsed_args.project_id}
         if parsed_args.user_id:
             params['user_id'] = parsed_args.user_id
-        per_class = http.request(
-            'GET', url, params=params).json()['usages']
+        per_class = http.get_json(url, params=params)['usages']
 
-        usages = [{'resource_class': k, 'usage': v}
-                  for k, v in per_class.items()]
-        rows = (utils.get_dict_properties(u, FIELDS) for u in usages)
-        return FIELDS, rows
+        # The (resource_class, usage) pairs already are the FIELDS rows.
+        return FIELDS, list(per_class.items())
 
 
 class ShowUsage(command.Lister):
@@ -83,9 +79,7 @@ class ShowUsage(command.Lister):
         http = self.app.client_manager.placement
 
         url = BASE_URL.format(uuid=parsed_args.uuid)
-        per_class = http.request('GET', url).json()['usages']
+        per_class = http.get_json(url)['usages']
 
-        usages = [{'resource_class': k, 'usage': v}
-                  for k, v in per_class.items()]
-        rows = (utils.get_dict_properties(u, FIELDS) for u in usages)
-        return FIELDS, rows
+        # The (resource_class, usage) pairs already are the FIELDS rows.
+        return FIELDS, list(per_class.items())
@@ -10,10 +10,12 @@
 # License for the specific language governing permissions and limitations
 # under the License.
 
+import contextlib
 import io
 import json
 import logging
 import random
+import sys
 
 import fixtures
 
@@ -54,11 +56,41 @@ class CommandException(Exception):
 class BaseTestCase(base.BaseTestCase):
     VERSION = '1.0'
 
+    @classmethod
+    def _get_shell(cls):
+        # Building an OpenStackShell builds the global option parser and
+        # loads the 'openstack.cli' commands, so every test class builds it
+        # once. run() loads the command groups of the API plugins again on
+        # every call and appends them to the command manager, so restore
+        # the command manager to its initial state before each run. The
+        # stdio streams captured at construction time have to be reset by
+        # the caller.
+        if '_shell' not in cls.__dict__:
+            cls._shell = shell.OpenStackShell()
+            cm = cls._shell.command_manager
+            cls._shell_commands = dict(cm.commands)
+            cls._shell_groups = list(cm.group_list)
+        cm = cls._shell.command_manager
+        cm.commands = dict(cls._shell_commands)
+        cm.group_list = list(cls._shell_groups)
+        return cls._shell
+
     def setUp(self):
         super(BaseTestCase, self).setUp()
         self.useFixture(capture.Logging())
+        # Every test gets its own placement database, so the objects a test
+        # creates do not need to be deleted again afterwards.
         self.placement = self.useFixture(placement.PlacementFixture())
 
+        # Make all requests as a noauth admin user.
+        self._exec_prefix = [
+            '--os-endpoint', self.placement.endpoint,
+            '--os-token', self.placement.token,
+            '--os-auth-type', 'admin_token',
+        ]
+        if self.VERSION is not None:
+            self._exec_prefix += ['--os-placement-api-version', self.VERSION]
+
         # Work around needing to reset the session's notion of where
         # we are going.
         def mock_get(obj, instance, owner):
@@ -71,6 +103,11 @@ class BaseTestCase(base.BaseTestCase):
             'osc_lib.clientmanager.ClientCache.__get__',
             mock_get))
 
+        # The placement fixture serves every request from one in-memory
+        # sqlite connection, which cannot run transactions concurrently.
+        self.useFixture(fixtures.MonkeyPatch(
+            'osc_placement.http.MAX_CONCURRENT_REQUESTS', 1))
+
         # Reset log level on a set of packages. See comment on RESET_LOGGING
         # assigment, above.
         for name in RESET_LOGGING:
@@ -78,16 +115,12 @@ class BaseTestCase(base.BaseTestCase):
 
     def openstack(self, cmd, may_fail=False, use_json=False,
                   may_print_to_stderr=False):
-        to_exec = []
-        # Make all requests as a noauth admin user.
-        to_exec += [
-            '--os-endpoint', self.placement.endpoint,
-            '--os-token', self.placement.token,
-            '--os-auth-type', 'admin_token',
-        ]
-        if self.VERSION is not None:
-            to_exec += ['--os-placement-api-version', self.VERSION]
-        to_exec += cmd.split()
+        # cmd is either an argv list or a string of space separated words.
+        if isinstance(cmd, str):
+            cmd = cmd.split()
+        else:
+            cmd = [str(arg) for arg in cmd]
+        to_exec = self._exec_prefix + cmd
         if use_json:
             to_exec += ['-f', 'json']
 
@@ -95,11 +128,13 @@ class BaseTestCase(base.BaseTestCase):
         # output trapping around the run().
         self.output = io.StringIO()
         self.error = io.StringIO()
-        stdout_fix = fixtures.MonkeyPatch('sys.stdout', self.output)
-        stderr_fix = fixtures.MonkeyPatch('sys.stderr', self.error)
-        with stdout_fix, stderr_fix:
+        with contextlib.redirect_stdout(self.output), \
+                contextlib.redirect_stderr(self.error):
             try:
-                os_shell = shell.OpenStackShell()
+                os_shell = self._get_shell()
+                os_shell.stdin = sys.stdin
+                os_shell.stdout = self.output
+                os_shell.stderr = self.error
                 return_code = os_shell.run(to_exec)
             # Catch SystemExit to trap some error responses, mostly from the
             # argparse lib which has a tendency to exit for you instead of
@@ -168,33 +203,21 @@ class BaseTestCase(base.BaseTestCase):
         if not name:
             name = self.rand_name(name='', prefix=RP_PREFIX)
 
-        to_exec = 'resource provider create ' + name
+        cmd = ['resource', 'provider', 'create', name]
         if parent_provider_uuid is not None:
-            to_exec += ' --parent-provider ' + parent_provider_uuid
-        res = self.openstack(to_exec, use_json=True)
-
-        def cleanup():
-            try:
-                self.resource_provider_delete(res['uuid'])
-            except CommandException as exc:
-                # may have already been deleted by a test case
-                err_message = str(exc).lower()
-                if 'no resource provider' not in err_message:
-                    raise
-        self.addCleanup(cleanup)
-
-        return res
+            cmd += ['--parent-provider', parent_provider_uuid]
+        return self.openstack(cmd, use_json=True)
 
     def resource_provider_set(self, uuid, name, parent_provider_uuid=None):
-        to_exec = 'resource provider set ' + uuid + ' --name ' + name
+        cmd = ['resource', 'provider', 'set', uuid, '--name', name]
         if parent_provider_uuid is not None:
-            to_exec += ' --parent-provider ' + parent_provider_uuid
-        return self.openstack(to_exec, use_json=True)
+            cmd += ['--parent-provider', parent_provider_uuid]
+        return self.openstack(cmd, use_json=True)
 
     def resource_provider_show(self, uuid, allocations=False):
-        cmd = 'resource provider show ' + uuid
+        cmd = ['resource', 'provider', 'show', uuid]
         if allocations:
-            cmd = cmd + ' --allocations'
+            cmd.append('--allocations')
 
         return self.openstack(cmd, use_json=True)
 
@@ -202,105 +225,82 @@ class BaseTestCase(base.BaseTestCase):
                                aggregate_uuids=None, resources=None,
                                in_tree=None, required=None, forbidden=None,
                                member_of=None, may_print_to_stderr=False):
-        to_exec = 'resource provider list'
+        cmd = ['resource', 'provider', 'list']
         if uuid:
-            to_exec += ' --uuid ' + uuid
+            cmd += ['--uuid', uuid]
         if name:
-            to_exec += ' --name ' + name
-        if aggregate_uuids:
-            to_exec += ' ' + ' '.join(
-                '--aggregate-uuid %s' % a for a in aggregate_uuids)
-        if resources:
-            to_exec += ' ' + ' '.join('--resource %s' % r for r in resources)
+            cmd += ['--name', name]
+        for a in aggregate_uuids or ():
+            cmd += ['--aggregate-uuid', a]
+        for r in resources or ():
+            cmd += ['--resource', r]
         if in_tree:
-            to_exec += ' --in-tree ' + in_tree
-        if required:
-            to_exec += ' ' + ' '.join('--required %s' % t for t in required)
-        if forbidden:
-            to_exec += ' ' + ' '.join('--forbidden %s' % f for f in forbidden)
-        if member_of:
-            to_exec += ' ' + ' '.join(
-                ['--member-of %s' % m for m in member_of])
+            cmd += ['--in-tree', in_tree]
+        for t in required or ():
+            cmd += ['--required', t]
+        for f in forbidden or ():
+            cmd += ['--forbidden', f]
+        for m in member_of or ():
+            cmd += ['--member-of', m]
 
         return self.openstack(
-            to_exec, use_json=True, may_print_to_stderr=may_print_to_stderr)
+            cmd, use_json=True, may_print_to_stderr=may_print_to_stderr)
 
     def resource_provider_delete(self, uuid):
-        return self.openstack('resource provider delete ' + uuid)
+        return self.openstack(['resource', 'provider', 'delete', uuid])
 
     def resource_allocation_show(self, consumer_uuid, columns=()):
-        cmd = 'resource provider allocation show ' + consumer_uuid
-        cmd += ' '.join(' --column %s' % c for c in columns)
+        cmd = ['resource', 'provider', 'allocation', 'show', consumer_uuid]
+        for c in columns:
+            cmd += ['--column', c]
         return self.openstack(cmd, use_json=True)
 
     def resource_allocation_set(self, consumer_uuid, allocations,
                                 project_id=None, user_id=None,
                                 consumer_type=None, use_json=True,
                                 may_print_to_stderr=False):
-        cmd = 'resource provider allocation set {allocs} {uuid}'.format(
-            uuid=consumer_uuid,
-            allocs=' '.join('--allocation {}'.format(a) for a in allocations)
-        )
+        cmd = ['resource', 'provider', 'allocation', 'set']
+        for a in allocations:
+            cmd += ['--allocation', a]
+        cmd.append(consumer_uuid)
         if project_id:
-            cmd += ' --project-id %s' % project_id
+            cmd += ['--project-id', project_id]
         if user_id:
-            cmd += ' --user-id %s' % user_id
+            cmd += ['--user-id', user_id]
         if consumer_type:
-            cmd += ' --consumer-type %s' % consumer_type
-        result = self.openstack(
+            cmd += ['--consumer-type', consumer_type]
+        return self.openstack(
             cmd, use_json=use_json, may_print_to_stderr=may_print_to_stderr)
 
-        def cleanup(uuid):
-            try:
-                self.openstack('resource provider allocation delete ' + uuid)
-            except CommandException as exc:
-                # may have already been deleted by a test case
-                if 'not found' in str(exc).lower():
-                    pass
-        self.addCleanup(cleanup, consumer_uuid)
-
-        return result
-
     def resource_allocation_unset(
         self, consumer_uuid, provider=None, resource_class=None, use_json=True,
         columns=(),
     ):
-        cmd = 'resource provider allocation unset %s' % consumer_uuid
-        if resource_class:
-            cmd += ' ' + ' '.join(
-                '--resource-class %s' % rc for rc in resource_class)
+        cmd = ['resource', 'provider', 'allocation', 'unset', consumer_uuid]
+        for rc in resource_class or ():
+            cmd += ['--resource-class', rc]
         if provider:
             # --provider can be specified multiple times so if we only get
             # a single string value convert to a list.
             if isinstance(provider, str):
                 provider = [provider]
-            cmd += ' ' + ' '.join(
-                '--provider %s' % rp_uuid for rp_uuid in provider)
-
-        cmd += ' '.join(' --column %s' % c for c in columns)
-
-        result = self.openstack(cmd, use_json=use_json)
-
-        def cleanup(uuid):
-            try:
-                self.openstack('resource provider allocation delete ' + uuid)
-            except CommandException as exc:
-                # may have already been deleted by a test case
-                if 'not found' in str(exc).lower():
-                    pass
-        self.addCleanup(cleanup, consumer_uuid)
+            for rp_uuid in provider:
+                cmd += ['--provider', rp_uuid]
+        for c in columns:
+            cmd += ['--column', c]
 
-        return result
+        return self.openstack(cmd, use_json=use_json)
 
     def resource_allocation_delete(self, consumer_uuid):
-        cmd = 'resource provider allocation delete ' + consumer_uuid
+        cmd = ['resource', 'provider', 'allocation', 'delete', consumer_uuid]
         return self.openstack(cmd)
 
     def resource_inventory_show(
         self, uuid, resource_class, *, include_used=False,
     ):
         resource = self.openstack(
-            f'resource provider inventory show {uuid} {resource_class}',
+            ['resource', 'provider', 'inventory', 'show', uuid,
+             resource_class],
             use_json=True,
         )
         if not include_used:
@@ -310,7 +310,7 @@ class BaseTestCase(base.BaseTestCase):
 
     def resource_inventory_list(self, uuid, *, include_used=False):
         resources = self.openstack(
-            f'resource provider inventory list {uuid}',
+            ['resource', 'provider', 'inventory', 'list', uuid],
             use_json=True,
         )
         if not include_used:
@@ -320,153 +320,139 @@ class BaseTestCase(base.BaseTestCase):
         return resources
 
     def resource_inventory_delete(self, uuid, resource_class=None):
-        cmd = 'resource provider inventory delete {uuid}'.format(uuid=uuid)
+        cmd = ['resource', 'provider', 'inventory', 'delete', uuid]
         if resource_class:
-            cmd += ' --resource-class ' + resource_class
+            cmd += ['--resource-class', resource_class]
         self.openstack(cmd)
 
     def resource_inventory_set(self, uuid, *resources, **kwargs):
-        opts = []
+        cmd = ['resource', 'provider', 'inventory', 'set', uuid]
+        for r in resources:
+            cmd += ['--resource', r]
         if kwargs.get('aggregate'):
-            opts.append('--aggregate')
+            cmd.append('--aggregate')
         if kwargs.get('amend'):
-            opts.append('--amend')
+            cmd.append('--amend')
         if kwargs.get('dry_run'):
-            opts.append('--dry-run')
-        fmt = 'resource provider inventory set {uuid} {resources} {opts}'
-        cmd = fmt.format(
-            uuid=uuid,
-            resources=' '.join(['--resource %s' % r for r in resources]),
-            opts=' '.join(opts))
+            cmd.append('--dry-run')
+        if kwargs.get('clear'):
+            cmd.append('--clear')
         return self.openstack(cmd, use_json=True)
 
     def resource_inventory_class_set(self, uuid, resource_class, **kwargs):
-        opts = ['--%s=%s' % (k, v) for k, v in kwargs.items()]
-        cmd = 'resource provider inventory class set {uuid} {rc} {opts}'.\
-            format(uuid=uuid, rc=resource_class, opts=' '.join(opts))
+        cmd = ['resource', 'provider', 'inventory', 'class', 'set', uuid,
+               resource_class]
+        cmd += ['--%s=%s' % (k, v) for k, v in kwargs.items()]
         return self.openstack(cmd, use_json=True)
 
     def resource_provider_show_usage(self, uuid):
-        return self.openstack('resource provider usage show ' + uuid,
+        return self.openstack(['resource', 'provider', 'usage', 'show', uuid],
                               use_json=True)
 
     def resource_show_usage(self, project_id, user_id=None):
-        cmd = 'resource usage show %s' % project_id
+        cmd = ['resource', 'usage', 'show', project_id]
         if user_id:
-            cmd += ' --user-id %s' % user_id
+            cmd += ['--user-id', user_id]
         return self.openstack(cmd, use_json=True)
 
-    def resource_provider_aggregate_list(self, uuid):
-        return self.openstack('resource provider aggregate list ' + uuid,
-                              use_json=True)
+    def resource_provider_aggregate_list(self, *uuids):
+        return self.openstack(
+            ['resource', 'provider', 'aggregate', 'list', *uuids],
+            use_json=True)
 
     def resource_provider_aggregate_set(self, uuid, *aggregates,
                                         **kwargs):
         generation = kwargs.get('generation')
-        cmd = 'resource provider aggregate set %s ' % uuid
-        cmd += ' '.join('--aggregate %s' % aggregate
-                        for aggregate in aggregates)
+        cmd = ['resource', 'provider', 'aggregate', 'set', uuid]
+        for aggregate in aggregates:
+            cmd += ['--aggregate', aggregate]
         if generation is not None:
-            cmd += ' --generation %s' % generation
+            cmd += ['--generation', str(generation)]
         return self.openstack(cmd, use_json=True)
 
     def resource_class_list(self):
-        return self.openstack('resource class list', use_json=True)
+        return self.openstack(['resource', 'class', 'list'], use_json=True)
 
     def resource_class_show(self, name):
-        return self.openstack('resource class show ' + name, use_json=True)
+        return self.openstack(['resource', 'class', 'show', name],
+                              use_json=True)
 
     def resource_class_create(self, name):
-        return self.openstack('resource class create ' + name)
+        return self.openstack(['resource', 'class', 'create', name])
 
     def resource_class_set(self, name):
-        return self.openstack('resource class set ' + name)
+        return self.openstack(['resource', 'class', 'set', name])
 
     def resource_class_delete(self, name):
-        return self.openstack('resource class delete ' + name)
+        return self.openstack(['resource', 'class', 'delete', name])
 
     def trait_list(self, name=None, associated=False):
-        cmd = 'trait list'
+        cmd = ['trait', 'list']
         if name:
-            cmd += ' --name ' + name
+            cmd += ['--name', name]
         if associated:
-            cmd += ' --associated'
+            cmd.append('--associated')
         return self.openstack(cmd, use_json=True)
 
     def trait_show(self, name):
-        cmd = 'trait show %s' % name
-        return self.openstack(cmd, use_json=True)
+        return self.openstack(['trait', 'show', name], use_json=True)
 
     def trait_create(self, name):
-        cmd = 'trait create %s' % name
-        self.openstack(cmd)
-
-        def cleanup():
-            try:
-                self.trait_delete(name)
-            except CommandException as exc:
-                # may have already been deleted by a test case
-                err_message = str(exc).lower()
-                if 'http 404' not in err_message:
-                    raise
-        self.addCleanup(cleanup)
+        self.openstack(['trait', 'create', name])
 
     def trait_delete(self, name):
-        cmd = 'trait delete %s' % name
-        self.openstack(cmd)
+        self.openstack(['trait', 'delete', name])
 
     def resource_provider_trait_list(self, uuid):
-        cmd = 'resource provider trait list %s ' % uuid
+        cmd = ['resource', 'provider', 'trait', 'list', uuid]
         return self.openstack(cmd, use_json=True)
 
     def resource_provider_trait_set(self, uuid, *traits):
-        cmd = 'resource provider trait set %s ' % uuid
-        cmd += ' '.join('--trait %s' % trait for trait in traits)
+        cmd = ['resource', 'provider', 'trait', 'set', uuid]
+        for trait in traits:
+            cmd += ['--trait', trait]
         return self.openstack(cmd, use_json=True)
 
     def resource_provider_trait_delete(self, uuid):
-        cmd = 'resource provider trait delete %s ' % uuid
-        self.openstack(cmd)
+        self.openstack(['resource', 'provider', 'trait', 'delete', uuid])
 
     def allocation_candidate_list(self, resources=None, required=None,
                                   forbidden=None, limit=None,
                                   aggregate_uuids=None, member_of=None,
                                   may_print_to_stderr=False):
-        cmd = 'allocation candidate list '
+        cmd = ['allocation', 'candidate', 'list']
         cmd += self._allocation_candidates_option(
             resources, required, forbidden, aggregate_uuids, member_of)
         if limit is not None:
-            cmd += ' --limit %d' % limit
+            cmd += ['--limit', str(limit)]
         return self.openstack(
             cmd, use_json=True, may_print_to_stderr=may_print_to_stderr)
 
     def allocation_candidate_granular(self, groups, group_policy=None,
                                       limit=None):
-        cmd = 'allocation candidate list '
+        cmd = ['allocation', 'candidate', 'list']
         for suffix, req_group in groups.items():
             if suffix:
-                cmd += ' --group %s' % suffix
+                cmd += ['--group', str(suffix)]
             cmd += self._allocation_candidates_option(**req_group)
             if limit is not None:
-                cmd += ' --limit %d' % limit
+                cmd += ['--limit', str(limit)]
             if group_policy is not None:
-                cmd += ' --group-policy %s' % group_policy
+                cmd += ['--group-policy', group_policy]
         return self.openstack(cmd, use_json=True)
 
     def _allocation_candidates_option(self, resources=None, required=None,
                                       forbidden=None, aggregate_uuids=None,
                                       member_of=None):
-        opt = ''
-        if resources:
-            opt += ' ' + ' '.join(
-                '--resource %s' % resource for resource in resources)
-        if required is not None:
-            opt += ''.join([' --required %s' % t for t in required])
-        if forbidden:
-            opt += ' ' + ' '.join('--forbidden %s' % f for f in forbidden)
-        if aggregate_uuids:
-            opt += ' ' + ' '.join(
-                '--aggregate-uuid %s' % a for a in aggregate_uuids)
-        if member_of:
-            opt += ' ' + ' '.join(['--member-of %s' % m for m in member_of])
+        opt = []
+        for resource in resources or ():
+            opt += ['--resource', resource]
+        for t in required or ():
+            opt += ['--required', t]
+        for f in forbidden or ():
+            opt += ['--forbidden', f]
+        for a in aggregate_uuids or ():
+            opt += ['--aggregate-uuid', a]
+        for m in member_of or ():
+            opt += ['--member-of', m]
         return opt
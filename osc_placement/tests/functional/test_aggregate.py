@@ -18,6 +18,9 @@ from osc_placement.tests.functional import base
 class TestAggregate(base.BaseTestCase):
     VERSION = '1.1'
 
+    def _set_aggregates(self, rp, *aggs):
+        return self.resource_provider_aggregate_set(rp['uuid'], *aggs)
+
     def test_fail_if_no_rp(self):
         self.assertCommandFailed(
             base.ARGUMENTS_MISSING,
@@ -71,6 +74,19 @@ class TestAggregate(base.BaseTestCase):
         rows = self.resource_provider_aggregate_set(rps[1]['uuid'])
         self.assertEqual([], rows)
 
+    def test_list_aggregates_of_multiple_rps(self):
+        rps = [self.resource_provider_create() for _ in range(3)]
+        aggs = [str(uuid.uuid4()) for _ in range(2)]
+        self._set_aggregates(rps[0], *aggs)
+        self._set_aggregates(rps[1], aggs[0])
+
+        rows = self.resource_provider_aggregate_list(
+            *[rp['uuid'] for rp in rps])
+        expected = {(rps[0]['uuid'], aggs[0]), (rps[0]['uuid'], aggs[1]),
+                    (rps[1]['uuid'], aggs[0])}
+        self.assertEqual(
+            expected, {(r['resource_provider'], r['uuid']) for r in rows})
+
     def test_success_set_large_number_aggregates(self):
         rp = self.resource_provider_create()
         aggs = {str(uuid.uuid4()) for _ in range(100)}
@@ -101,6 +117,10 @@ class TestAggregate(base.BaseTestCase):
 class TestAggregate119(TestAggregate):
     VERSION = '1.19'
 
+    def _set_aggregates(self, rp, *aggs):
+        return self.resource_provider_aggregate_set(
+            rp['uuid'], *aggs, generation=rp['generation'])
+
     def test_success_set_aggregate(self):
         rp = self.resource_provider_create()
         aggs = {str(uuid.uuid4()) for _ in range(2)}
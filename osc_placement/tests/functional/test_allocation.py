@@ -376,6 +376,14 @@ class TestAllocationUnset112(base.BaseTestCase):
         ]
         self.assertEqual(expected, updated_allocs)
 
+    def test_allocation_unset_provider_not_allocated(self):
+        """Tests unsetting a provider the consumer is not allocated from."""
+        allocs = self.resource_allocation_show(self.consumer_uuid1)
+        updated_allocs = self.resource_allocation_unset(
+            self.consumer_uuid1, provider=self.rp3['uuid'])
+        # Nothing changed, not even the provider generations.
+        self.assertCountEqual(allocs, updated_allocs)
+
     def test_allocation_unset_one_resource_class(self):
         """Tests removing allocations for resource classes."""
         updated_allocs = self.resource_allocation_unset(
@@ -111,7 +111,35 @@ class TestSetInventory(base.BaseTestCase):
 
     def test_set_empty_inventories(self):
         rp = self.resource_provider_create()
-        self.assertEqual([], self.resource_inventory_set(rp['uuid']))
+        self.assertEqual(
+            [], self.resource_inventory_set(rp['uuid'], clear=True))
+
+    def test_fail_if_no_resource_and_no_clear(self):
+        rp = self.resource_provider_create()
+        self.resource_inventory_set(rp['uuid'], 'DISK_GB=16')
+        self.assertCommandFailed(
+            'No --resource specified. Use --clear',
+            self.resource_inventory_set, rp['uuid'])
+        # the existing inventory is untouched
+        self.assertEqual(
+            ['DISK_GB'],
+            [r['resource_class']
+             for r in self.resource_inventory_list(rp['uuid'])])
+
+    def test_fail_if_clear_with_resource_or_amend(self):
+        rp = self.resource_provider_create()
+        self.resource_inventory_set(rp['uuid'], 'DISK_GB=16')
+        self.assertCommandFailed(
+            '--clear cannot be used with --resource or --amend',
+            self.resource_inventory_set, rp['uuid'], 'VCPU=8', clear=True)
+        self.assertCommandFailed(
+            '--clear cannot be used with --resource or --amend',
+            self.resource_inventory_set, rp['uuid'], amend=True, clear=True)
+        # the existing inventory is untouched
+        self.assertEqual(
+            ['DISK_GB'],
+            [r['resource_class']
+             for r in self.resource_inventory_list(rp['uuid'])])
 
     def test_fail_if_incorrect_resource(self):
         rp = self.resource_provider_create()
@@ -196,7 +224,7 @@ class TestSetInventory(base.BaseTestCase):
     def test_delete_via_set(self):
         rp = self.resource_provider_create()
         self.resource_inventory_set(rp['uuid'], 'DISK_GB=16')
-        self.resource_inventory_set(rp['uuid'])
+        self.resource_inventory_set(rp['uuid'], clear=True)
         self.assertEqual([], self.resource_inventory_list(rp['uuid']))
 
     def test_fail_if_incorrect_parameters_set_class_inventory(self):
@@ -61,7 +61,7 @@ class TestAllocation(base.BaseTestCase):
         allocations = ['=,']
         self.assertRaisesRegex(
             ValueError,
-            '2 is required',
+            'Incorrect allocation',
             allocation.parse_allocations, allocations)
         allocations = ['abc=155']
         self.assertRaisesRegex(
@@ -73,3 +73,19 @@ class TestAllocation(base.BaseTestCase):
             ValueError,
             'parameter is required',
             allocation.parse_allocations, allocations)
+
+    def test_fail_message_contains_allocation_string(self):
+        allocations = ['rp=abc,VCPU=4', 'rp=abc,MEMORY_MB']
+        ex = self.assertRaises(
+            ValueError, allocation.parse_allocations, allocations)
+        self.assertEqual(
+            "Incorrect allocation string format: 'rp=abc,MEMORY_MB'",
+            str(ex))
+
+    def test_fail_message_contains_allocation_string_not_int(self):
+        for allocation_string in ['rp=abc,VCPU=four', ' rp=a,VCPU=1']:
+            ex = self.assertRaises(
+                ValueError, allocation.parse_allocations, [allocation_string])
+            self.assertEqual(
+                'Incorrect allocation string format: %r' % allocation_string,
+                str(ex))
@@ -20,18 +20,6 @@ import osc_placement.resources.common as common
 
 
 class TestCommon(base.BaseTestCase):
-    def test_encode(self):
-        self.assertEqual(u'привет'.encode('utf-8'),
-                         common.encode(u'привет'))
-
-    def test_encode_custom_encoding(self):
-        self.assertEqual(u'привет'.encode('utf-16'),
-                         common.encode(u'привет', 'utf-16'))
-
-    def test_encode_non_string(self):
-        self.assertEqual(b'bytesvalue',
-                         common.encode(b'bytesvalue'))
-
     def test_url_with_filters(self):
         base_url = '/resource_providers'
         expected = '/resource_providers?name=test&uuid=123456'
@@ -41,6 +29,13 @@ class TestCommon(base.BaseTestCase):
         actual = common.url_with_filters(base_url, filters)
         self.assertEqual(expected, actual)
 
+    def test_url_with_filters_existing_query(self):
+        base_url = '/resource_providers?in_tree=abc'
+        expected = '/resource_providers?in_tree=abc&name=test'
+
+        actual = common.url_with_filters(base_url, {'name': 'test'})
+        self.assertEqual(expected, actual)
+
     def test_url_with_filters_empty(self):
         base_url = '/resource_providers'
 
@@ -54,3 +49,15 @@ class TestCommon(base.BaseTestCase):
 
         actual = common.url_with_filters(base_url, {'name': u'привет'})
         self.assertEqual(expected, actual)
+
+    def test_row_getter(self):
+        getter = common.row_getter(('name', 'uuid', 'generation'))
+
+        self.assertEqual(('test', '123456', ''),
+                         getter({'uuid': '123456', 'name': 'test'}))
+
+    def test_parse_filter_resources(self):
+        self.assertEqual(
+            'VCPU:4,MEMORY_MB:2048',
+            common.parse_filter_resources(['VCPU=4', 'MEMORY_MB=2048']))
+        self.assertEqual('', common.parse_filter_resources([]))
@@ -13,6 +13,8 @@
 import json
 from unittest import mock
 
+import fixtures
+import keystoneauth1.exceptions.catalog as ks_catalog
 import keystoneauth1.exceptions.http as ks_exceptions
 import osc_lib.exceptions as exceptions
 import oslotest.base as base
@@ -35,6 +37,17 @@ class FakeResponse(requests.Response):
 
 
 class TestSessionClient(base.BaseTestCase):
+    def setUp(self):
+        super(TestSessionClient, self).setUp()
+        self.session = mock.Mock()
+        self.ks_filter = {'service_type': 'placement',
+                          'region_name': 'mock_region',
+                          'interface': 'mock_interface'}
+
+    def _client(self, api_version='1.1'):
+        return http.SessionClient(
+            self.session, self.ks_filter, api_version=api_version)
+
     def test_wrap_http_exceptions(self):
         def go():
             with http._wrap_http_exceptions():
@@ -54,6 +67,17 @@ class TestSessionClient(base.BaseTestCase):
         self.assertIn('No resource provider with uuid 123 found',
                       str(exc))
 
+    def test_wrap_http_exceptions_string_status(self):
+        def go():
+            with http._wrap_http_exceptions():
+                error = {"errors": [{"status": 409, "detail": "Conflict"}]}
+                response = mock.Mock(content=json.dumps(error))
+                raise ks_exceptions.HttpError(response=response,
+                                              http_status='409')
+
+        exc = self.assertRaises(exceptions.Conflict, go)
+        self.assertEqual(409, exc.http_status)
+
     def test_unexpected_response(self):
         def go():
             with http._wrap_http_exceptions():
@@ -113,3 +137,181 @@ class TestSessionClient(base.BaseTestCase):
         session.request.assert_called_once_with(
             '/', 'GET', endpoint_filter=ks_filter,
             headers=expected_headers, raise_exc=False)
+
+    def _use_version_cache(self):
+        self.useFixture(fixtures.EnvironmentVariable(
+            'XDG_CACHE_HOME', self.useFixture(fixtures.TempDir()).path))
+        self.session.get_endpoint.return_value = 'http://placement.example.com'
+
+    def test_session_client_version_cached(self):
+        self._use_version_cache()
+        self.session.request.return_value = FakeResponse(200)
+
+        # 1. the first negotiation talks to the server
+        client = self._client('1')
+        self.assertEqual(version.MAX_VERSION_NO_GAP, client.api_version)
+        self.session.request.assert_called_once()
+        self.session.reset_mock()
+
+        # 2. the next client picks the version up from the cache
+        client = self._client('1')
+        self.assertEqual(version.MAX_VERSION_NO_GAP, client.api_version)
+        self.session.request.assert_not_called()
+
+        # 3. an expired entry is ignored
+        with mock.patch.object(http, 'VERSION_CACHE_TTL', 0):
+            self._client('1')
+        self.session.request.assert_called_once()
+
+    def test_session_client_version_cache_prunes_expired(self):
+        self._use_version_cache()
+        self.session.request.return_value = FakeResponse(200)
+        http._save_version_cache({
+            'placement http://old.example.com 1.0': {
+                'version': '1.10', 'timestamp': 0},
+            'broken': 'entry'})
+
+        self._client('1')
+
+        cache = http._load_version_cache()
+        self.assertEqual(1, len(cache))
+        entry, = cache.values()
+        self.assertEqual(version.MAX_VERSION_NO_GAP, entry['version'])
+
+    def test_session_client_version_endpoint_not_found(self):
+        self._use_version_cache()
+        self.session.get_endpoint.side_effect = (
+            ks_catalog.EndpointNotFound())
+        self.session.request.return_value = FakeResponse(200)
+
+        # Without an endpoint the cache is skipped, the request reports
+        # the actual error.
+        client = self._client('1')
+        self.assertEqual(version.MAX_VERSION_NO_GAP, client.api_version)
+        self.session.request.assert_called_once()
+        self.assertEqual({}, http._load_version_cache())
+
+    def test_session_client_version_auth_error(self):
+        self._use_version_cache()
+        self.session.get_endpoint.side_effect = ks_exceptions.Unauthorized()
+
+        self.assertRaises(ks_exceptions.Unauthorized, self._client, '1')
+        self.session.request.assert_not_called()
+
+    def test_session_client_cached_version_rejected(self):
+        self._use_version_cache()
+        self.session.request.return_value = FakeResponse(200)
+        self._client('1')
+        client = self._client('1')
+        self.session.reset_mock()
+
+        # The server got downgraded and rejects the cached version, the
+        # client negotiates again and retries with the new version.
+        mock_server_version = '1.10'
+        error = {
+            "errors": [{"status": 406,
+                        "title": "Not Acceptable",
+                        "min_version": "1.0",
+                        "max_version": mock_server_version}]
+        }
+        not_acceptable = FakeResponse(
+            406, content=jsonutils.dump_as_bytes(error))
+        ok = FakeResponse(200)
+        self.session.request.side_effect = [
+            ks_exceptions.NotAcceptable(response=not_acceptable),
+            not_acceptable,
+            ok,
+        ]
+
+        self.assertIs(ok, client.request('GET', '/resource_providers'))
+        self.assertEqual(mock_server_version, client.api_version)
+        self.assertEqual(3, self.session.request.call_count)
+        retry_headers = self.session.request.call_args[1]['headers']
+        self.assertEqual('placement ' + mock_server_version,
+                         retry_headers['OpenStack-API-Version'])
+
+    def test_session_client_version_cached_fallback_upgrade(self):
+        self._use_version_cache()
+        error = {
+            "errors": [{"status": 406,
+                        "title": "Not Acceptable",
+                        "min_version": "1.0",
+                        "max_version": "1.10"}]
+        }
+        self.session.request.return_value = FakeResponse(
+            406, content=jsonutils.dump_as_bytes(error))
+        client = self._client('1')
+        self.assertEqual('1.10', client.api_version)
+        self.session.reset_mock()
+
+        # The server got upgraded. The cached fallback version is lower
+        # than the client maximum, so it is not reused and the server is
+        # probed again.
+        self.session.request.return_value = FakeResponse(200)
+        client = self._client('1')
+        self.assertEqual(version.MAX_VERSION_NO_GAP, client.api_version)
+        self.session.request.assert_called_once()
+        entry, = http._load_version_cache().values()
+        self.assertEqual(version.MAX_VERSION_NO_GAP, entry['version'])
+
+    def test_request_many(self):
+        client = self._client()
+        self.session.request.side_effect = lambda url, method, **kw: url
+
+        urls = ['/resource_providers/%d/aggregates' % i for i in range(20)]
+        resps = client.request_many([('GET', url) for url in urls])
+
+        # responses come back in the order of the requests
+        self.assertEqual(urls, resps)
+        self.assertEqual(20, self.session.request.call_count)
+
+    def test_request_many_error(self):
+        client = self._client()
+        error = {"errors": [{"status": 404, "detail": "No resource provider"}]}
+        response = mock.Mock(content=json.dumps(error))
+
+        def fake_request(url, method, **kwargs):
+            if url == '/b':
+                raise ks_exceptions.NotFound(response=response)
+            return url
+        self.session.request.side_effect = fake_request
+
+        self.assertRaises(exceptions.NotFound, client.request_many,
+                          [('GET', '/a'), ('GET', '/b'), ('GET', '/c')])
+
+    def test_get_json(self):
+        client = self._client()
+        self.session.request.return_value = mock.Mock(
+            content=b'{"aggregates": ["a", "b"]}')
+
+        self.assertEqual({'aggregates': ['a', 'b']},
+                         client.get_json('/resource_providers/1/aggregates'))
+        self.session.request.assert_called_once_with(
+            '/resource_providers/1/aggregates', 'GET',
+            headers={'OpenStack-API-Version': 'placement 1.1',
+                     'Accept': 'application/json'},
+            endpoint_filter=self.ks_filter)
+
+    def test_get_json_many(self):
+        client = self._client()
+        self.session.request.side_effect = lambda url, method, **kw: (
+            mock.Mock(content=json.dumps({'url': url}).encode()))
+
+        urls = ['/resource_providers/%d/aggregates' % i for i in range(3)]
+
+        self.assertEqual([{'url': url} for url in urls],
+                         client.get_json_many(urls))
+
+    def test_map_concurrently(self):
+        client = self._client()
+
+        def func(item):
+            if item == 3:
+                raise ValueError(item)
+            return item * 2
+
+        futures = client.map_concurrently(func, list(range(5)))
+
+        self.assertEqual([0, 2, 4], [f.result() for f in futures[:3]])
+        self.assertIsInstance(futures[3].exception(), ValueError)
+        self.assertEqual(8, futures[4].result())
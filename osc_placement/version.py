@@ -39,7 +39,7 @@ SUPPORTED_MICROVERSIONS = [
     '1.17',
     '1.18',
     '1.19',
-    '1.20',  # unused
+    '1.20',
     '1.21',
     '1.22',
     '1.23',  # unused